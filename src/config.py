@@ -38,3 +38,9 @@ class Config:
     DB_PORT = os.getenv("DB_PORT")
     DB_TABLE_PARENT = os.getenv("DB_TABLE_PARENT")
     DB_TABLE_CHILD = os.getenv("DB_TABLE_CHILD")
+    DB_TABLE_HEADWAY = os.getenv("DB_TABLE_HEADWAY")
+    HEADWAY_BUNCHING_MINUTES = os.getenv("HEADWAY_BUNCHING_MINUTES")
+    HEADWAY_GAP_MINUTES = os.getenv("HEADWAY_GAP_MINUTES")
+    POLL_INTERVAL_SECONDS = os.getenv("POLL_INTERVAL_SECONDS")
+    ETA_HISTORY_WEEKS = os.getenv("ETA_HISTORY_WEEKS")
+    LIVE_SERVER_PORT = os.getenv("LIVE_SERVER_PORT")
@@ -1,7 +1,8 @@
 from datetime import datetime
-from typing import Any, Iterable
+from typing import IO, Any, Iterable
 import psycopg2
 from psycopg2 import sql
+from psycopg2.extras import execute_values
 from logger import Logger
 
 
@@ -51,6 +52,16 @@ class DatabaseHandler:
         except Exception as e:
             self.logger.info(f"Error closing the connection: {e}")
 
+    def recover(self) -> None:
+        """Clear an aborted transaction, reconnect when the connection was lost"""
+        try:
+            if self.conn and not self.conn.closed:
+                self.conn.rollback()
+        except Exception as e:
+            self.logger.error(f"Error rolling back: {e}")
+        if not self.conn or self.conn.closed:
+            self.connect()
+
     def create_table(self, table_name: str, schema: str) -> None:
         try:
             self.cur.execute(
@@ -123,6 +134,7 @@ class DatabaseHandler:
             return [dict(zip(column_names, row)) for row in result]
         except Exception as e:
             self.logger.error(f"{e.__class__} Error: {e}")
+            self.conn.rollback()
 
     def execute_query(self, query: str, params: tuple[Any, ...] | None = None) -> list[tuple]:
         try:
@@ -131,6 +143,23 @@ class DatabaseHandler:
             return self.cur.fetchall()
         except Exception as e:
             self.logger.error(f"Error executing query: {e}")
+            self.conn.rollback()
+
+    def copy_query_to_file(self, query: sql.Composable, file: IO[str]) -> bool:
+        """Stream the result of query into file as CSV using COPY ... TO STDOUT.
+        Rows are written as they arrive, so memory stays flat regardless of size.
+        """
+        try:
+            copy_query = sql.SQL(
+                "COPY ({}) TO STDOUT WITH (FORMAT CSV, HEADER TRUE)"
+            ).format(query)
+            self.cur.copy_expert(copy_query, file)
+            self.conn.commit()
+            return True
+        except Exception as e:
+            self.logger.error(f"Error copying query to file: {e}")
+            self.conn.rollback()
+            return False
 
     def insert_row(self, table_name: str, data: dict[str, Any]) -> None:
         try:
@@ -146,6 +175,41 @@ class DatabaseHandler:
             self.logger.info("Successful")
         except Exception as e:
             self.logger.error(f"Error inserting data into table {table_name}: {e}")
+            self.conn.rollback()
+
+    def upsert_rows(
+        self,
+        table_name: str,
+        rows: list[dict[str, Any]],
+        conflict_columns: list[str],
+    ) -> None:
+        """Insert rows in a single statement, overwriting rows with the same conflict_columns"""
+        if not rows:
+            return
+        try:
+            columns = list(rows[0].keys())
+            update_columns = [c for c in columns if c not in conflict_columns]
+            query = sql.SQL(
+                "INSERT INTO {} ({}) VALUES %s ON CONFLICT ({}) DO UPDATE SET {}"
+            ).format(
+                sql.Identifier(table_name),
+                sql.SQL(", ").join(map(sql.Identifier, columns)),
+                sql.SQL(", ").join(map(sql.Identifier, conflict_columns)),
+                sql.SQL(", ").join(
+                    sql.SQL("{0} = EXCLUDED.{0}").format(sql.Identifier(c))
+                    for c in update_columns
+                ),
+            )
+            execute_values(
+                self.cur,
+                query.as_string(self.conn),
+                [[row[c] for c in columns] for row in rows],
+            )
+            self.conn.commit()
+            self.logger.info(f"{len(rows)} rows upserted into {table_name}.")
+        except Exception as e:
+            self.logger.error(f"Error upserting data into table {table_name}: {e}")
+            self.conn.rollback()
 
     def update_column(
         self, table_name: str, primary_key: dict[str, Any], update_data: dict[str, Any]
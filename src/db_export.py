@@ -0,0 +1,238 @@
+import argparse
+import os
+from datetime import datetime, timedelta, timezone
+from typing import Iterator
+from psycopg2 import sql
+from db_controller import DatabaseHandler
+from logger import Logger, LOGGING_CONFIG
+from config import Config
+
+
+KST = timezone(timedelta(hours=9))
+DATASETS = {"trips", "durations"}
+
+
+def parse_export_date(date_time: str) -> datetime:
+    """Parse ISO date&time str, naive values are taken as KST like the API"""
+    as_dt = datetime.fromisoformat(date_time)
+    if as_dt.tzinfo is None:
+        as_dt = as_dt.replace(tzinfo=KST)
+    return as_dt.astimezone(tz=timezone.utc)
+
+
+def split_time_windows(
+    from_date: datetime, to_date: datetime, window: timedelta
+) -> Iterator[tuple[datetime, datetime]]:
+    """Yields [start, end) windows covering from_date to to_date"""
+    start = from_date
+    while start < to_date:
+        end = min(start + window, to_date)
+        yield start, end
+        start = end
+
+
+def build_trips_query(
+    parent_table: str,
+    child_table: str,
+    start: datetime,
+    end: datetime,
+    route_id: str | None = None,
+) -> sql.Composed:
+    """bus_initial_entry joined with bus_stop_record for trips started in [start, end)"""
+    conditions = [
+        sql.SQL("bi.initiation_time >= {}").format(sql.Literal(start)),
+        sql.SQL("bi.initiation_time < {}").format(sql.Literal(end)),
+    ]
+    if route_id:
+        conditions.append(sql.SQL("bi.route_id = {}").format(sql.Literal(route_id)))
+    return sql.SQL(
+        """
+        SELECT bi.route_id, bi.initiation_time, bi.plate_number,
+            sr.station_sequence, sr.station_id, sr.arrival_time
+        FROM {} bi
+        JOIN {} sr
+            ON bi.initiation_time = sr.initiation_time
+            AND bi.plate_number = sr.plate_number
+        WHERE {}
+        ORDER BY bi.initiation_time, bi.plate_number, sr.station_sequence
+        """
+    ).format(
+        sql.Identifier(parent_table),
+        sql.Identifier(child_table),
+        sql.SQL(" AND ").join(conditions),
+    )
+
+
+def build_durations_query(
+    parent_table: str,
+    departure_station: int,
+    arrival_station: int,
+    start: datetime,
+    end: datetime,
+    route_id: str | None = None,
+) -> sql.Composed:
+    """get_duration_dates() results for trips started in [start, end)"""
+    conditions = [
+        sql.SQL("bi.initiation_time >= {}").format(sql.Literal(start)),
+        sql.SQL("bi.initiation_time < {}").format(sql.Literal(end)),
+    ]
+    if route_id:
+        conditions.append(sql.SQL("bi.route_id = {}").format(sql.Literal(route_id)))
+    # get_duration_dates() uses BETWEEN, the half-open bound is applied here
+    return sql.SQL(
+        """
+        SELECT bi.route_id, d.*
+        FROM get_duration_dates({}, {}, {}::TIMESTAMP, {}::TIMESTAMP) d
+        JOIN {} bi
+            ON bi.initiation_time = d.init AT TIME ZONE 'Asia/Seoul'
+            AND bi.plate_number = d.plate
+        WHERE {}
+        ORDER BY d.depart
+        """
+    ).format(
+        sql.Literal(departure_station),
+        sql.Literal(arrival_station),
+        sql.Literal(start),
+        sql.Literal(end),
+        sql.Identifier(parent_table),
+        sql.SQL(" AND ").join(conditions),
+    )
+
+
+def generate_export_file_name(
+    dataset: str,
+    start: datetime,
+    end: datetime,
+    route_id: str | None = None,
+    stations: tuple[int, int] | None = None,
+) -> str:
+    """Name holds everything that changes the query, so resuming never reuses
+    a file of another export. Window bounds are in KST, like --from and --to
+    """
+    if dataset == "durations" and stations:
+        dataset = f"{dataset}-{stations[0]}-{stations[1]}"
+    start_kst, end_kst = start.astimezone(KST), end.astimezone(KST)
+    return (
+        f"{dataset}_{route_id or "all"}_"
+        f"{start_kst.strftime("%Y%m%dT%H%M%z")}_{end_kst.strftime("%Y%m%dT%H%M%z")}.csv"
+    )
+
+
+def export_windows(
+    db: DatabaseHandler,
+    logger: Logger,
+    dataset: str,
+    output_dir: str,
+    from_date: datetime,
+    to_date: datetime,
+    window: timedelta,
+    table_names: tuple[str, str],
+    route_id: str | None = None,
+    stations: tuple[int, int] | None = None,
+) -> list[str]:
+    """Export dataset as one CSV file per time window.
+    Windows with a finished file are skipped, so an interrupted export resumes
+    where it stopped. Files are written as .part and renamed when complete.
+    """
+    if dataset not in DATASETS:
+        raise KeyError("Given dataset is not allowed.")
+    if dataset == "durations" and not stations:
+        raise ValueError("Departure and arrival stations are required for durations.")
+    if window <= timedelta(0):
+        raise ValueError("Export window must be positive.")
+    if from_date >= to_date:
+        raise ValueError("from_date must be earlier than to_date.")
+    parent_table, child_table = table_names
+    os.makedirs(output_dir, exist_ok=True)
+
+    written = []
+    for start, end in split_time_windows(from_date, to_date, window):
+        file_path = os.path.join(
+            output_dir,
+            generate_export_file_name(dataset, start, end, route_id, stations),
+        )
+        if os.path.exists(file_path):
+            logger.info(f"-- skip (exists) {file_path}")
+            continue
+        if dataset == "trips":
+            query = build_trips_query(parent_table, child_table, start, end, route_id)
+        else:
+            query = build_durations_query(parent_table, *stations, start, end, route_id)
+
+        part_path = f"{file_path}.part"
+        with open(part_path, "w", encoding="utf-8", newline="") as fp:
+            copied = db.copy_query_to_file(query, fp)
+        if not copied:
+            os.remove(part_path)
+            raise RuntimeError(f"Export failed for window {start} - {end}.")
+        os.replace(part_path, file_path)
+        logger.info(f"-- exported {file_path}")
+        written.append(file_path)
+    return written
+
+
+def parse_args(args: list[str] | None = None) -> argparse.Namespace:
+    parser = argparse.ArgumentParser(
+        description="Stream trips or travel durations to chunked CSV files."
+    )
+    parser.add_argument("dataset", choices=sorted(DATASETS))
+    parser.add_argument("--from", dest="from_date", required=True, help="ISO date, KST if naive")
+    parser.add_argument("--to", dest="to_date", required=True, help="ISO date, KST if naive")
+    parser.add_argument("--route", dest="route_id", default=None)
+    parser.add_argument("--departure", type=int, default=None)
+    parser.add_argument("--arrival", type=int, default=None)
+    parser.add_argument("--window-hours", type=int, default=24)
+    parser.add_argument("--output-dir", default="exports")
+    return parser.parse_args(args)
+
+
+def main() -> None:
+    args = parse_args()
+    log_file_name = os.path.join(
+        Config.WORKING_DIRECTORY,
+        "logs",
+        f"{"_".join([*Config.APP_NAME, "export"])}.log",
+    )
+    logger = Logger(__name__, LOGGING_CONFIG, log_file_name).logger
+    stations = (
+        (args.departure, args.arrival)
+        if args.departure is not None and args.arrival is not None
+        else None
+    )
+    db = DatabaseHandler(
+        db_name=Config.DB_NAME,
+        user=Config.DB_USER,
+        password=Config.DB_PASSWORD,
+        host=Config.DB_HOST,
+        port=Config.DB_PORT,
+        logger=logger,
+    )
+    try:
+        logger.info(f"{"Export started":-^50}")
+        db.connect()
+        if not (db.conn and db.cur):
+            raise ConnectionError("No connection.")
+        written = export_windows(
+            db=db,
+            logger=logger,
+            dataset=args.dataset,
+            output_dir=args.output_dir,
+            from_date=parse_export_date(args.from_date),
+            to_date=parse_export_date(args.to_date),
+            window=timedelta(hours=args.window_hours),
+            table_names=(Config.DB_TABLE_PARENT, Config.DB_TABLE_CHILD),
+            route_id=args.route_id,
+            stations=stations,
+        )
+        logger.info(f"-- {len(written) = }")
+        logger.info(f"{"End":-^50}")
+    except Exception as exc:
+        logger.error(exc.__class__, exc_info=True)
+        # a non-zero exit tells a rerunning script that the export is incomplete
+        raise
+    finally:
+        db.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -15,3 +15,16 @@ CREATE TABLE bus_stop_record (
     PRIMARY KEY (initiation_time, plate_number, station_sequence),
     FOREIGN KEY (initiation_time, plate_number) REFERENCES bus_history(initiation_time, plate_number)
 );
+
+CREATE TABLE bus_headway_rollup (
+    route_id VARCHAR(15) NOT NULL,
+    station_sequence INT NOT NULL,
+    hour_start TIMESTAMPTZ NOT NULL,  -- Hour the later arrival of a headway falls in
+    samples INT NOT NULL,
+    mean_seconds REAL NOT NULL,
+    min_seconds REAL NOT NULL,
+    max_seconds REAL NOT NULL,
+    bunching INT NOT NULL,
+    gaps INT NOT NULL,
+    PRIMARY KEY (route_id, station_sequence, hour_start)
+);
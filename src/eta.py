@@ -0,0 +1,180 @@
+from datetime import datetime, timedelta, timezone
+from typing import Any
+import numpy as np
+from db_controller import DatabaseHandler
+
+
+KST = timezone(timedelta(hours=9))
+
+# Travel time of every segment (station_sequence -> station_sequence + 1) aggregated
+# by (route, segment, weekday, hour) in KST. When a bus skipped stations between two
+# records, the elapsed time is spread evenly over the skipped segments.
+SEGMENT_TIMES_QUERY = """
+    SELECT
+        route_id,
+        segment,
+        EXTRACT(ISODOW FROM prev_arrival AT TIME ZONE 'Asia/Seoul')::INT - 1 AS weekday,
+        EXTRACT(HOUR FROM prev_arrival AT TIME ZONE 'Asia/Seoul')::INT AS hour,
+        SUM(EXTRACT(EPOCH FROM (arrival_time - prev_arrival))
+            / (station_sequence - prev_sequence)) AS total_seconds,
+        COUNT(*) AS samples,
+        MAX(arrival_time) AS last_arrival
+    FROM (
+        SELECT
+            bi.route_id,
+            sr.station_sequence,
+            sr.arrival_time,
+            LAG(sr.station_sequence) OVER w AS prev_sequence,
+            LAG(sr.arrival_time) OVER w AS prev_arrival
+        FROM {parent_table} bi
+        JOIN {child_table} sr
+            ON bi.initiation_time = sr.initiation_time
+            AND bi.plate_number = sr.plate_number
+        WHERE sr.initiation_time > %s
+        WINDOW w AS (
+            PARTITION BY sr.initiation_time, sr.plate_number
+            ORDER BY sr.station_sequence
+        )
+    ) records
+    CROSS JOIN generate_series(prev_sequence, station_sequence - 1) AS segment
+    WHERE prev_sequence IS NOT NULL
+        AND station_sequence > prev_sequence
+        AND arrival_time > %s
+    GROUP BY route_id, segment, weekday, hour
+"""
+
+
+class EtaEngine:
+    """Predicts arrival times at downstream stations from historical segment times.
+    Per route, sums and counts are kept as (weekday, hour, segment) arrays and the
+    mean segment times are precomputed on refresh, so a prediction is an array
+    lookup and a cumulative sum without any query.
+    """
+
+    def __init__(
+        self,
+        db: DatabaseHandler,
+        table_names: tuple[str, str],
+        history: timedelta,
+        trip_lookback: timedelta = timedelta(hours=3),
+    ) -> None:
+        self.db = db
+        # the first refresh loads only this much history, not the whole table
+        self.history = history
+        self.parent_table, self.child_table = table_names
+        # trips are set inactive after 3 hours, older trips get no new records
+        self.trip_lookback = trip_lookback
+        self.watermark: datetime | None = None
+        self.sums: dict[str, np.ndarray] = {}
+        self.counts: dict[str, np.ndarray] = {}
+        self.means: dict[str, np.ndarray] = {}
+
+    def _ensure_capacity(self, route_id: str, segments: int) -> None:
+        """Grow arrays of route_id so that segment indices up to segments - 1 fit"""
+        current = self.sums.get(route_id)
+        if current is not None and current.shape[2] >= segments:
+            return
+        sums = np.zeros((7, 24, segments), dtype=np.float64)
+        counts = np.zeros((7, 24, segments), dtype=np.int64)
+        if current is not None:
+            sums[:, :, : current.shape[2]] = current
+            counts[:, :, : current.shape[2]] = self.counts[route_id]
+        self.sums[route_id] = sums
+        self.counts[route_id] = counts
+
+    def _compute_means(self, route_id: str) -> None:
+        """Mean per bucket, falling back to the same hour on any weekday,
+        then to the segment overall, then to the route's median segment time
+        so one never-seen segment does not void every station after it.
+        """
+        sums, counts = self.sums[route_id], self.counts[route_id]
+        with np.errstate(invalid="ignore", divide="ignore"):
+            bucket = sums / counts
+            hourly = sums.sum(axis=0) / counts.sum(axis=0)
+            overall = sums.sum(axis=(0, 1)) / counts.sum(axis=(0, 1))
+        means = np.where(counts > 0, bucket, hourly[None, :, :])
+        means = np.where(np.isnan(means), overall[None, None, :], means)
+        means = np.where(np.isnan(means), np.nanmedian(overall), means)
+        self.means[route_id] = means
+
+    def refresh(self) -> int:
+        """Load segment times recorded after the watermark. Returns the number of rows"""
+        if self.watermark is None:
+            since = datetime.now(tz=timezone.utc) - self.history
+            trips_since = since
+        else:
+            since = self.watermark
+            trips_since = since - self.trip_lookback
+        query = SEGMENT_TIMES_QUERY.format(
+            parent_table=self.parent_table, child_table=self.child_table
+        )
+        rows = self.db.execute_query(query, (trips_since, since))
+        if not rows:
+            return 0
+
+        by_route: dict[str, list[tuple]] = {}
+        for row in rows:
+            by_route.setdefault(row[0], []).append(row[1:])
+        for route_id, route_rows in by_route.items():
+            segment, weekday, hour, total_seconds, samples, _ = map(
+                np.array, zip(*route_rows)
+            )
+            self._ensure_capacity(route_id, int(segment.max()) + 1)
+            np.add.at(
+                self.sums[route_id],
+                (weekday, hour, segment),
+                total_seconds.astype(np.float64),
+            )
+            np.add.at(self.counts[route_id], (weekday, hour, segment), samples)
+            self._compute_means(route_id)
+        self.watermark = max(row[6] for row in rows)
+        return len(rows)
+
+    def predict(
+        self, route_id: str, station_sequences: np.ndarray, query_times: list[datetime]
+    ) -> np.ndarray:
+        """Seconds from query time until each bus reaches each station.
+        Returns (buses, stations + 1) indexed by station_sequence,
+        NaN for stations not downstream or beyond the recorded segments.
+        """
+        sequences = np.asarray(station_sequences, dtype=np.int64)
+        means = self.means.get(route_id)
+        if means is None or not len(sequences):
+            return np.full((len(sequences), 1), np.nan)
+        local_times = [t.astimezone(KST) for t in query_times]
+        weekdays = np.fromiter((t.weekday() for t in local_times), dtype=np.int64)
+        hours = np.fromiter((t.hour for t in local_times), dtype=np.int64)
+
+        segments = means.shape[2]
+        segment_times = means[weekdays, hours]  # (buses, segments)
+        downstream = np.arange(segments)[None, :] >= sequences[:, None]
+        cumulative = np.cumsum(np.where(downstream, segment_times, 0.0), axis=1)
+
+        eta = np.full((len(sequences), segments + 1), np.nan)
+        eta[:, 1:] = cumulative
+        eta[np.arange(segments + 1)[None, :] <= sequences[:, None]] = np.nan
+        return eta
+
+    def predict_arrivals(
+        self, live_buses: list[dict[str, Any]]
+    ) -> dict[str, dict[int, datetime]]:
+        """For converted API buses, {plate_number: {station_sequence: arrival_time}}"""
+        by_route: dict[str, list[dict[str, Any]]] = {}
+        for bus in live_buses:
+            by_route.setdefault(bus.get("route_id"), []).append(bus)
+
+        predictions = {}
+        for route_id, buses in by_route.items():
+            eta = self.predict(
+                route_id,
+                np.array([bus.get("station_sequence") for bus in buses]),
+                [bus.get("query_time") for bus in buses],
+            )
+            for bus, seconds in zip(buses, eta):
+                stations = np.flatnonzero(~np.isnan(seconds))
+                query_time = bus.get("query_time")
+                predictions[bus.get("plate_number")] = {
+                    int(station): query_time + timedelta(seconds=float(seconds[station]))
+                    for station in stations
+                }
+        return predictions
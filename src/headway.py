@@ -0,0 +1,173 @@
+from datetime import datetime, timedelta
+from typing import Any
+import numpy as np
+from db_controller import DatabaseHandler
+from logger import Logger
+
+
+ROLLUP_CONFLICT_COLUMNS = ["route_id", "station_sequence", "hour_start"]
+
+# Stop arrivals of the given routes since a given time, initiation_time bound keeps it
+# on the index. Like SEGMENT_TIMES_QUERY in eta.py, stations a bus skipped between two
+# records get an arrival time interpolated between them, so a headway is always
+# measured between consecutive buses. The recorded arrival time is kept alongside.
+RECENT_ARRIVALS_QUERY = """
+    SELECT
+        route_id,
+        station,
+        EXTRACT(EPOCH FROM prev_arrival + (arrival_time - prev_arrival)
+            * (station - prev_sequence)::FLOAT8
+            / (station_sequence - prev_sequence))::FLOAT8,
+        EXTRACT(EPOCH FROM arrival_time)::FLOAT8
+    FROM (
+        SELECT
+            bi.route_id,
+            sr.station_sequence,
+            sr.arrival_time,
+            COALESCE(LAG(sr.station_sequence) OVER w, sr.station_sequence - 1)
+                AS prev_sequence,
+            COALESCE(LAG(sr.arrival_time) OVER w, sr.arrival_time) AS prev_arrival
+        FROM {child_table} sr
+        JOIN {parent_table} bi
+            ON bi.initiation_time = sr.initiation_time
+            AND bi.plate_number = sr.plate_number
+        WHERE bi.route_id = ANY(%s)
+            AND sr.initiation_time >= %s
+        WINDOW w AS (
+            PARTITION BY sr.initiation_time, sr.plate_number
+            ORDER BY sr.station_sequence
+        )
+    ) records
+    CROSS JOIN generate_series(prev_sequence + 1, station_sequence) AS station
+    WHERE station_sequence > prev_sequence
+        AND arrival_time >= %s
+"""
+
+
+def compute_headways(
+    station_sequences: np.ndarray, arrival_times: np.ndarray
+) -> tuple[np.ndarray, np.ndarray, np.ndarray, np.ndarray]:
+    """Time between consecutive arrivals at the same station.
+    Returns (station_sequence, arrival_time of the later bus, headway seconds,
+    index of the later bus' arrival in the given arrays)
+    """
+    order = np.lexsort((arrival_times, station_sequences))
+    stations, times = station_sequences[order], arrival_times[order]
+    same_station = stations[1:] == stations[:-1]
+    return (
+        stations[1:][same_station],
+        times[1:][same_station],
+        np.diff(times)[same_station],
+        order[1:][same_station],
+    )
+
+
+def summarize_headways(
+    stations: np.ndarray,
+    headways: np.ndarray,
+    bunching_seconds: float,
+    gap_seconds: float,
+) -> dict[str, np.ndarray]:
+    """Per station headway stats, each array aligned with "station_sequence" """
+    station_sequences, index = np.unique(stations, return_inverse=True)
+    size = len(station_sequences)
+    samples = np.bincount(index, minlength=size)
+    mins = np.full(size, np.inf)
+    maxs = np.full(size, -np.inf)
+    np.minimum.at(mins, index, headways)
+    np.maximum.at(maxs, index, headways)
+    return {
+        "station_sequence": station_sequences,
+        "samples": samples,
+        "mean_seconds": np.bincount(index, weights=headways, minlength=size) / samples,
+        "min_seconds": mins,
+        "max_seconds": maxs,
+        "bunching": np.bincount(index[headways < bunching_seconds], minlength=size),
+        "gaps": np.bincount(index[headways > gap_seconds], minlength=size),
+    }
+
+
+def run_headway_analysis(
+    db: DatabaseHandler,
+    logger: Logger,
+    table_names: tuple[str, str],
+    rollup_table: str,
+    live_buses: list[dict[str, Any]],
+    bunching_threshold: timedelta,
+    gap_threshold: timedelta,
+    trip_lookback: timedelta = timedelta(hours=3),
+) -> dict[str, int]:
+    """Recompute the current hour's headway rollup of every live route.
+    Headways ending at this tick are checked against the thresholds and logged.
+    Returns {route_id: flagged headways}
+    """
+    parent_table, child_table = table_names
+    query = RECENT_ARRIVALS_QUERY.format(
+        parent_table=parent_table, child_table=child_table
+    )
+    bunching_seconds = bunching_threshold.total_seconds()
+    gap_seconds = gap_threshold.total_seconds()
+
+    query_times: dict[str, datetime] = {}
+    for bus in live_buses:
+        query_times[bus.get("route_id")] = bus.get("query_time")
+    if not query_times:
+        return {}
+
+    # headways span back past the hour start, their earlier arrivals are needed too
+    since = (
+        min(query_times.values()).replace(minute=0, second=0, microsecond=0)
+        - trip_lookback
+    )
+    rows = db.execute_query(
+        query, (list(query_times), since - trip_lookback, since)
+    )
+    if not rows:
+        return {}
+    route_ids, all_stations, all_times, all_recorded = map(np.array, zip(*rows))
+
+    flagged = {}
+    for route_id, query_time in query_times.items():
+        in_route = route_ids == route_id
+        if not in_route.any():
+            continue
+        hour_start = query_time.replace(minute=0, second=0, microsecond=0)
+        stations, times, headways, later = compute_headways(
+            all_stations[in_route], all_times[in_route]
+        )
+        in_hour = times >= hour_start.timestamp()
+        if not in_hour.any():
+            continue
+        stats = summarize_headways(
+            stations[in_hour], headways[in_hour], bunching_seconds, gap_seconds
+        )
+        db.upsert_rows(
+            rollup_table,
+            [
+                {
+                    "route_id": route_id,
+                    "station_sequence": int(stats["station_sequence"][i]),
+                    "hour_start": hour_start,
+                    "samples": int(stats["samples"][i]),
+                    "mean_seconds": float(stats["mean_seconds"][i]),
+                    "min_seconds": float(stats["min_seconds"][i]),
+                    "max_seconds": float(stats["max_seconds"][i]),
+                    "bunching": int(stats["bunching"][i]),
+                    "gaps": int(stats["gaps"][i]),
+                }
+                for i in range(len(stats["station_sequence"]))
+            ],
+            ROLLUP_CONFLICT_COLUMNS,
+        )
+
+        # records of this tick carry the query time as arrival_time,
+        # stations they skipped are flagged along with them
+        this_tick = all_recorded[in_route][later] >= query_time.timestamp() - 1
+        out_of_range = (headways < bunching_seconds) | (headways > gap_seconds)
+        for i in np.flatnonzero(this_tick & out_of_range):
+            kind = "bunching" if headways[i] < bunching_seconds else "gap"
+            logger.info(
+                f"-- {route_id} station {stations[i]} {kind} {headways[i] / 60:.1f} min"
+            )
+        flagged[route_id] = int((this_tick & out_of_range).sum())
+    return flagged
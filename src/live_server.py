@@ -0,0 +1,328 @@
+import json
+import threading
+from datetime import datetime, timedelta, timezone
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Any
+from urllib.parse import parse_qs, urlparse
+from logger import Logger
+
+
+type RouteSnapshot = dict[str, Any]
+
+POSITION_KEYS = (
+    "version",
+    "token",
+    "etag",
+    "body",
+    "query_time",
+    "published_at",
+    "buses",
+    "changed",
+    "removed",
+    "delta_floor",
+)
+ETA_KEYS = ("etas", "eta_version", "eta_etag", "eta_body")
+
+
+def generate_bus_payload(bus_data: dict[str, Any]) -> dict[str, Any]:
+    """JSON friendly live position of a converted API bus"""
+    return {
+        "plate_number": bus_data.get("plate_number"),
+        "station_sequence": bus_data.get("station_sequence"),
+        "station_id": bus_data.get("station_id"),
+    }
+
+
+def generate_eta_payload(arrivals: dict[int, datetime]) -> dict[str, str]:
+    """Predicted arrivals rounded to the minute, so small shifts do not count as changes"""
+    return {
+        str(station): (arrival + timedelta(seconds=30))
+        .replace(second=0, microsecond=0)
+        .isoformat()
+        for station, arrival in arrivals.items()
+    }
+
+
+class SnapshotCache:
+    """Latest snapshot per route for the live server.
+    A published snapshot is never modified, a new one replaces it as a whole,
+    so request threads read a consistent snapshot without locking.
+    """
+
+    def __init__(self, max_age: float, delta_versions: int = 100) -> None:
+        # snapshots older than max_age seconds are not served, e.g. after failed ticks
+        self.max_age = max_age
+        # deltas are served for clients at most delta_versions behind
+        self.delta_versions = delta_versions
+        # versions restart with the process, the epoch tells them apart
+        self.epoch = str(int(datetime.now(tz=timezone.utc).timestamp()))
+        self._routes: dict[str, RouteSnapshot] = {}
+        self._lock = threading.Lock()
+
+    def publish(
+        self,
+        live_buses: list[dict[str, Any]],
+        predictions: dict[str, dict[int, datetime]] | None = None,
+        route_ids: list[str] | None = None,
+    ) -> None:
+        """Replace snapshots of routes in live_buses and route_ids,
+        a route without buses gets an empty snapshot with its last plates removed
+        """
+        by_route: dict[str, list[dict[str, Any]]] = {
+            route_id: [] for route_id in route_ids or []
+        }
+        for bus in live_buses:
+            by_route.setdefault(bus.get("route_id"), []).append(bus)
+
+        with self._lock:
+            routes = dict(self._routes)
+            for route_id, buses in by_route.items():
+                routes[route_id] = self._build_snapshot(
+                    routes.get(route_id), route_id, buses, predictions or {}
+                )
+            self._routes = routes
+
+    def _build_snapshot(
+        self,
+        previous: RouteSnapshot | None,
+        route_id: str,
+        buses: list[dict[str, Any]],
+        predictions: dict[str, dict[int, datetime]],
+    ) -> RouteSnapshot:
+        """Positions and ETAs are versioned apart, ETAs move on every tick.
+        A version only advances when its content differs from the previous one.
+        """
+        checked_at = datetime.now(tz=timezone.utc)
+        payloads = {bus.get("plate_number"): generate_bus_payload(bus) for bus in buses}
+        etas = {
+            plate: generate_eta_payload(predictions[plate])
+            for plate in payloads
+            if predictions.get(plate)
+        }
+        query_time = buses[0].get("query_time") if buses else None
+        snapshot = {"checked_at": checked_at}
+
+        if previous and previous["buses"] == payloads:
+            snapshot.update({k: previous[k] for k in POSITION_KEYS})
+        else:
+            snapshot.update(
+                self._build_positions(previous, route_id, payloads, query_time, checked_at)
+            )
+
+        if previous and previous["etas"] == etas:
+            snapshot.update({k: previous[k] for k in ETA_KEYS})
+        else:
+            eta_version = previous["eta_version"] + 1 if previous else 1
+            eta_token = f"{self.epoch}.{eta_version}"
+            snapshot.update(
+                {
+                    "etas": etas,
+                    "eta_version": eta_version,
+                    "eta_etag": f'"{route_id}-eta-{eta_token}"',
+                    "eta_body": json.dumps(
+                        {
+                            "route_id": route_id,
+                            "version": eta_token,
+                            "query_time": query_time.isoformat() if query_time else None,
+                            "eta": etas,
+                        }
+                    ).encode("utf-8"),
+                }
+            )
+        return snapshot
+
+    def _build_positions(
+        self,
+        previous: RouteSnapshot | None,
+        route_id: str,
+        payloads: dict[str, dict[str, Any]],
+        query_time: datetime | None,
+        published_at: datetime,
+    ) -> RouteSnapshot:
+        version = previous["version"] + 1 if previous else 1
+        previous_payloads = previous["buses"] if previous else {}
+        previous_changed = previous["changed"] if previous else {}
+        changed = {
+            plate: (
+                previous_changed[plate]
+                if previous_payloads.get(plate) == payload
+                else version
+            )
+            for plate, payload in payloads.items()
+        }
+        delta_floor = max(version - self.delta_versions, 0)
+        removed = {
+            plate: removed_version
+            for plate, removed_version in (previous["removed"] if previous else {}).items()
+            if removed_version > delta_floor and plate not in payloads
+        }
+        removed.update(
+            {plate: version for plate in previous_payloads if plate not in payloads}
+        )
+        token = f"{self.epoch}.{version}"
+        full_body = {
+            "route_id": route_id,
+            "version": token,
+            "query_time": query_time.isoformat() if query_time else None,
+            "published_at": published_at.isoformat(),
+            "delta": False,
+            "buses": list(payloads.values()),
+            "removed": [],
+        }
+        return {
+            "version": version,
+            "token": token,
+            "etag": f'"{route_id}-{token}"',
+            "body": json.dumps(full_body).encode("utf-8"),
+            "query_time": full_body["query_time"],
+            "published_at": published_at,
+            "buses": payloads,
+            "changed": changed,
+            "removed": removed,
+            "delta_floor": delta_floor,
+        }
+
+    def get(self, route_id: str) -> RouteSnapshot | None:
+        """Latest snapshot of route_id, None when missing or older than max_age"""
+        snapshot = self._routes.get(route_id)
+        if snapshot is None or snapshot_age(snapshot) > self.max_age:
+            return None
+        return snapshot
+
+    def route_versions(self) -> dict[str, str]:
+        """Tokens of the routes get() would serve, stale ones are left out"""
+        return {
+            route_id: snapshot["token"]
+            for route_id, snapshot in self._routes.items()
+            if snapshot_age(snapshot) <= self.max_age
+        }
+
+    def parse_since(self, since: str) -> int | None:
+        """Version number of an "<epoch>.<version>" token,
+        None for tokens of another process. Raises ValueError when malformed
+        """
+        epoch, _, version = since.partition(".")
+        version = int(version)
+        return version if epoch == self.epoch else None
+
+
+def snapshot_age(snapshot: RouteSnapshot) -> float:
+    """Seconds since the route was last refreshed, whether or not it changed"""
+    return (datetime.now(tz=timezone.utc) - snapshot["checked_at"]).total_seconds()
+
+
+def render_delta(route_id: str, snapshot: RouteSnapshot, since: int) -> bytes:
+    """Buses changed and plates removed after version since"""
+    return json.dumps(
+        {
+            "route_id": route_id,
+            "version": snapshot["token"],
+            "query_time": snapshot["query_time"],
+            "published_at": snapshot["published_at"].isoformat(),
+            "delta": True,
+            "buses": [
+                payload
+                for plate, payload in snapshot["buses"].items()
+                if snapshot["changed"][plate] > since
+            ],
+            "removed": [
+                plate
+                for plate, removed_version in snapshot["removed"].items()
+                if removed_version > since
+            ],
+        }
+    ).encode("utf-8")
+
+
+def etag_matches(if_none_match: str | None, etag: str) -> bool:
+    """Weak comparison against an If-None-Match list, as used for GET"""
+    if not if_none_match:
+        return False
+    if if_none_match.strip() == "*":
+        return True
+    tags = {tag.strip().removeprefix("W/") for tag in if_none_match.split(",")}
+    return etag in tags
+
+
+class LivePositionsHandler(BaseHTTPRequestHandler):
+    """GET /routes, GET /routes/<route_id>[?since=<version token>]
+    and GET /routes/<route_id>/eta
+    """
+
+    cache: SnapshotCache
+
+    def do_GET(self) -> None:
+        url = urlparse(self.path)
+        parts = [p for p in url.path.split("/") if p]
+        if parts == ["routes"]:
+            body = json.dumps(self.cache.route_versions()).encode("utf-8")
+            self._send(200, body)
+            return
+        is_eta = parts[2:] == ["eta"]
+        if len(parts) < 2 or parts[0] != "routes" or (len(parts) > 2 and not is_eta):
+            self._send(404, b'{"error": "not found"}')
+            return
+
+        route_id = parts[1]
+        snapshot = self.cache.get(route_id)
+        if snapshot is None:
+            self._send(404, b'{"error": "route not found or stale"}')
+            return
+        if is_eta:
+            etag = snapshot["eta_etag"]
+            if etag_matches(self.headers.get("If-None-Match"), etag):
+                self._send(304, None, etag)
+                return
+            self._send(200, snapshot["eta_body"], etag)
+            return
+        since = parse_qs(url.query).get("since", [None])[0]
+        try:
+            since = self.cache.parse_since(since) if since is not None else None
+        except ValueError:
+            self._send(400, b'{"error": "since must be a version token"}')
+            return
+        # unknown or too old versions, e.g. from before a restart, get the full snapshot
+        if since is not None and not (
+            snapshot["delta_floor"] <= since <= snapshot["version"]
+        ):
+            since = None
+        # a delta is a different representation than the full snapshot
+        etag = (
+            snapshot["etag"]
+            if since is None
+            else f'"{route_id}-{snapshot["token"]}-since-{since}"'
+        )
+        if etag_matches(self.headers.get("If-None-Match"), etag):
+            self._send(304, None, etag)
+            return
+        if since is None:
+            self._send(200, snapshot["body"], etag)
+            return
+        self._send(200, render_delta(route_id, snapshot, since), etag)
+
+    def _send(self, status: int, body: bytes | None, etag: str | None = None) -> None:
+        self.send_response(status)
+        if etag:
+            self.send_header("ETag", etag)
+        self.send_header("Cache-Control", "no-cache")
+        if body is not None:
+            self.send_header("Content-Type", "application/json")
+            self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        if body is not None:
+            self.wfile.write(body)
+
+    def log_message(self, format: str, *args: Any) -> None:
+        """Keep request logs out of stderr, the worker log is for ticks"""
+
+
+def start_live_server(
+    cache: SnapshotCache, port: int, logger: Logger, host: str = "0.0.0.0"
+) -> ThreadingHTTPServer:
+    """Serve cache in a background thread, stops with the worker process"""
+    handler = type("Handler", (LivePositionsHandler,), {"cache": cache})
+    server = ThreadingHTTPServer((host, port), handler)
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    logger.info(f"{f"Live server on {host}:{port}":-^50}")
+    return server
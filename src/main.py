@@ -1,5 +1,7 @@
 import os
+import time
 from datetime import datetime, timezone, timedelta
+from typing import Any
 from bus_api import DataFetcher, DataParser
 from db_controller import DatabaseHandler
 from db_operation import (
@@ -11,6 +13,9 @@ from db_operation import (
     identify_differences,
     filter_inactive_db,
 )
+from eta import EtaEngine
+from headway import run_headway_analysis
+from live_server import SnapshotCache, start_live_server
 from logger import Logger, LOGGING_CONFIG
 from config import Config
 from exceptions import NoDataError
@@ -22,7 +27,8 @@ def format_logs(data: dict[str, str | datetime]) -> list[str]:
 
 def run_get_and_record(
     db: DatabaseHandler, logger: Logger, table_names: tuple[str, str]
-) -> None:
+) -> list[dict[str, Any]]:
+    """Fetch live bus locations, reconcile them with DB and return them converted"""
     ### Set table names for bus_initial_entry, bus_stop_record
     parent_table, child_table = table_names
 
@@ -43,8 +49,8 @@ def run_get_and_record(
     if not (api_query_time and api_bus_locations):
         raise NoDataError("No bus is operating in the route.")
     logger.info(f"-- {len(api_bus_locations) = }")
-    for bus in api_bus_locations:
-        converted = convert_api_raw(bus, api_query_time)
+    live_buses = [convert_api_raw(bus, api_query_time) for bus in api_bus_locations]
+    for converted in live_buses:
         logger.info(f"-- {format_logs(converted)}")
 
     ### Get DB
@@ -144,6 +150,73 @@ def run_get_and_record(
                 bus_initial_entry_table=parent_table,
             )
 
+    return live_buses
+
+
+def run_tick(
+    db: DatabaseHandler,
+    logger: Logger,
+    table_names: tuple[str, str],
+    eta_engine: EtaEngine | None = None,
+    snapshot_cache: SnapshotCache | None = None,
+) -> None:
+    try:
+        live_buses = run_get_and_record(
+            db=db, logger=logger, table_names=table_names
+        )
+    except NoDataError:
+        # clear the last buses of the route once service ends
+        if snapshot_cache is not None:
+            snapshot_cache.publish([], route_ids=[Config.BUS_ROUTE_ID])
+        raise
+
+    ### Headways between consecutive buses at each station
+    # analytics failures are only logged, live positions are published regardless
+    if Config.DB_TABLE_HEADWAY:
+        logger.info(f"{"Headway analysis":-<30}")
+        try:
+            flagged = run_headway_analysis(
+                db=db,
+                logger=logger,
+                table_names=table_names,
+                rollup_table=Config.DB_TABLE_HEADWAY,
+                live_buses=live_buses,
+                bunching_threshold=timedelta(
+                    minutes=float(Config.HEADWAY_BUNCHING_MINUTES or 2)
+                ),
+                gap_threshold=timedelta(
+                    minutes=float(Config.HEADWAY_GAP_MINUTES or 20)
+                ),
+            )
+            logger.info(f"-- {flagged = }")
+        except Exception as exc:
+            logger.error(exc.__class__, exc_info=True)
+            db.recover()
+
+    ### Predict arrivals with segment times recorded so far
+    predictions = None
+    if eta_engine is not None:
+        logger.info(f"{"Predict ETA":-<30}")
+        try:
+            refreshed = eta_engine.refresh()
+            logger.info(f"-- {refreshed = }")
+            predictions = eta_engine.predict_arrivals(live_buses)
+        except Exception as exc:
+            logger.error(exc.__class__, exc_info=True)
+            db.recover()
+        for plate_number, arrivals in (predictions or {}).items():
+            if not arrivals:
+                continue
+            next_station = min(arrivals)
+            logger.info(
+                f"-- {plate_number} next {next_station} "
+                f"{arrivals[next_station].strftime("%y%m%d-%H%M%S")} / {len(arrivals)} stations"
+            )
+
+    ### Publish snapshot for the live server
+    if snapshot_cache is not None:
+        snapshot_cache.publish(live_buses, predictions)
+
 
 def main() -> None:
     log_file_name = os.path.join(
@@ -166,11 +239,55 @@ def main() -> None:
         db.connect()
         if not (db.conn and db.cur):
             raise ConnectionError("No connection.")
-        run_get_and_record(
-            db=db,
-            logger=logger,
-            table_names=(Config.DB_TABLE_PARENT, Config.DB_TABLE_CHILD),
-        )
+        table_names = (Config.DB_TABLE_PARENT, Config.DB_TABLE_CHILD)
+        # without an interval a single tick is run, e.g. when scheduled by cron
+        poll_interval = int(Config.POLL_INTERVAL_SECONDS or 0)
+        # ETA history is kept in memory, only worth loading for a running daemon
+        eta_engine = None
+        if poll_interval and Config.ETA_HISTORY_WEEKS:
+            eta_engine = EtaEngine(
+                db=db,
+                table_names=table_names,
+                history=timedelta(weeks=float(Config.ETA_HISTORY_WEEKS)),
+            )
+            # load the history before polling, so it does not delay the first tick
+            logger.info(f"{"Load ETA history":-<30}")
+            try:
+                logger.info(f"-- {eta_engine.refresh() = }")
+            except Exception as exc:
+                logger.error(exc.__class__, exc_info=True)
+                db.recover()
+        snapshot_cache = None
+        if poll_interval and Config.LIVE_SERVER_PORT:
+            # a few missed ticks make a snapshot stale
+            snapshot_cache = SnapshotCache(max_age=3 * poll_interval)
+            start_live_server(
+                cache=snapshot_cache,
+                port=int(Config.LIVE_SERVER_PORT),
+                logger=logger,
+            )
+        while True:
+            try:
+                run_tick(
+                    db=db,
+                    logger=logger,
+                    table_names=table_names,
+                    eta_engine=eta_engine,
+                    snapshot_cache=snapshot_cache,
+                )
+            except NoDataError as exc:
+                if not poll_interval:
+                    raise
+                logger.info(f"-- {exc}")
+            except Exception as exc:
+                if not poll_interval:
+                    raise
+                logger.error(exc.__class__, exc_info=True)
+                # a failed statement aborts the transaction for every later tick
+                db.recover()
+            if not poll_interval:
+                break
+            time.sleep(poll_interval)
         db.close()
         logger.info(f"{"End":-^50}")
     except Exception as exc: